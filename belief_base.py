@@ -1,102 +1,378 @@
+import logging
 import re
-from sympy.logic.boolalg import to_cnf, simplify_logic
+from sympy.logic.boolalg import And, Implies, is_cnf, simplify_logic, to_cnf
 from sympy.parsing.sympy_parser import parse_expr
 from typing import Optional
-from itertools import combinations
-from resolution import negate_formula, resolution
+from collections import OrderedDict, deque
+from resolution import kernels, negate_formula, resolution, to_clauses
+
+log = logging.getLogger(__name__)
+
+ATOM_PATTERN = re.compile(r"\b(?!True\b|False\b)[A-Za-z_]\w*")
+TOKEN_PATTERN = re.compile(r"\w+|<<>>|>>|<<|\*\*|\S")
+IFF_PATTERN = re.compile(r"(.+?)\s*<<>>\s*(.+)")  # splits 'a <<>> b' at its first biconditional
+EXACT_CONTRACTION_LIMIT = 12  # relevant beliefs up to which contraction computes all kernels
+RESULT_CACHE_SIZE = 4096  # in-memory entailment results kept per base, least recently used dropped first
+
+
+def strip_outer_parens(formula: str) -> str:
+    """Remove parentheses that enclose the whole formula, e.g. '((p & q))' -> 'p & q'."""
+    formula = formula.strip()
+    while formula.startswith("(") and formula.endswith(")"):
+        depth = 0
+        for i, char in enumerate(formula):
+            depth += {"(": 1, ")": -1}.get(char, 0)
+            if depth == 0 and i < len(formula) - 1:
+                return formula  # The first parenthesis closes before the end
+        formula = formula[1:-1].strip()
+    return formula
+
+
+def atoms_of(formula: str) -> frozenset:
+    """Return the names of the propositional atoms occurring in a formula."""
+    return frozenset(ATOM_PATTERN.findall(formula))
+
+
+def cheapest_hitting_set(kernel_masks: list, entrenchments: list) -> Optional[int]:
+    """Return the mask of the cheapest set of items that meets every kernel mask, or None if a kernel is empty.
+
+    Bit i stands for item i. Ties in total entrenchment go to the set with fewer items, then
+    to the one whose sorted item positions come first. Branch and bound: the smallest unmet
+    kernel is picked and each of its items tried, cheapest first; a branch is cut once it
+    cannot beat the best hitting set found so far, which needs non-negative entrenchments."""
+    if not all(kernel_masks):
+        return None
+    items_of = {
+        kernel: sorted((i for i in range(len(entrenchments)) if kernel >> i & 1), key=lambda i: entrenchments[i])
+        for kernel in kernel_masks
+    }
+    best = None  # ((total, size, indices), mask)
+
+    def search(mask: int, total: int, size: int):
+        nonlocal best
+        unmet = [kernel for kernel in kernel_masks if not kernel & mask]
+        if not unmet:
+            key = (total, size, tuple(i for i in range(len(entrenchments)) if mask >> i & 1))
+            if best is None or key < best[0]:
+                best = (key, mask)
+            return
+        items = items_of[min(unmet, key=lambda kernel: len(items_of[kernel]))]
+        # Any completion adds at least the cheapest item of this kernel
+        if best is not None and (total + entrenchments[items[0]], size + 1) > best[0][:2]:
+            return
+        for i in items:
+            search(mask | 1 << i, total + entrenchments[i], size + 1)
+
+    search(0, 0, 0)
+    return best[1]
 
 
 class BeliefBase:
     """A class to represent a belief base for an agent with entrenchment."""
 
-    def __init__(self):
-        """Initialize an empty belief base."""
-        self.beliefs = []  # list of tuples: (expr, entrenchment)
+    def __init__(self, cache_path: Optional[str] = None):
+        """Initialize an empty belief base.
 
-    def expand(self, belief: str, entrenchment: Optional[int] = 50):
+        If `cache_path` is given, entailment results are persisted in a shelve
+        database at that path and reused across runs."""
+        self.cache_path = cache_path
+        self._beliefs = {}  # CNF belief string -> entrenchment, in insertion order
+        self._var_map = {}  # atom name -> positive int used in clause literals
+        self._cnf_cache = {}  # normalised or parsed belief string -> simplified CNF string
+        self._clause_cache = {}  # belief string -> list of integer clauses
+        self._learned = set()  # resolvents derived from the base alone, reused across queries
+        self._results = OrderedDict()  # (base clauses, negated formula) -> entailment result, LRU, shared with views
+        self._atoms_of = {}  # belief string -> atoms it mentions
+        self._kb_clauses = None  # clauses of all beliefs, rebuilt lazily after changes
+        self._units = None  # literals of all unit clauses, rebuilt lazily after changes
+        self._unit_clash = False  # whether the base itself holds both p and ~p as units
+        self._atom_index = None  # atom -> beliefs mentioning it, rebuilt lazily after changes
+
+    @property
+    def beliefs(self) -> list:
+        """List of (belief, entrenchment) tuples in insertion order."""
+        return list(self._beliefs.items())
+
+    def _check_entrenchment(self, entrenchment: int):
+        """Reject negative entrenchments, which the cheapest-first contraction search cannot order."""
+        if entrenchment < 0:
+            raise ValueError(f"Entrenchment must be non-negative: {entrenchment}")
+
+    def expand(self, belief: str, entrenchment: int = 50):
         """Add a belief to the belief base with optional entrenchment, after simplification."""
+        self._check_entrenchment(entrenchment)
         simplified = self.convert_to_cnf(belief)
-        self.beliefs.append((simplified, entrenchment))
+        if simplified in self._beliefs:
+            # Re-insertion only updates the entrenchment; clauses and indexes are unchanged
+            self._beliefs[simplified] = entrenchment
+            return
+        self._beliefs[simplified] = entrenchment
+        self._atoms_of[simplified] = atoms_of(simplified)
+        # Encode once at insertion so entailment queries only look clauses up
+        self.clauses_of(simplified)
+        self._kb_clauses = self._units = None
+        self._atom_index = None
 
     def remove_belief(self, belief: str):
         """Remove a belief from the belief base."""
-        for b in self.beliefs:
-            if b[0] == belief:
-                self.beliefs.remove(b)
-                return
-        raise ValueError(f"Belief not found: {belief}")
+        belief = self._canon(belief)
+        if belief not in self._beliefs:
+            raise ValueError(f"Belief not found: {belief}")
+        del self._beliefs[belief]
+        del self._atoms_of[belief]
+        self._kb_clauses = self._units = None
+        self._atom_index = None
+        # Learned resolvents may depend on the removed belief
+        self._learned.clear()
 
-    def update_belief(self, old_belief: str, new_belief: str, entrenchment: Optional[int] = 50):
+    def update_belief(self, old_belief: str, new_belief: str, entrenchment: int = 50):
         """Update an existing belief in the belief base."""
+        # Checked before the removal so that a rejected update leaves the base unchanged
+        self._check_entrenchment(entrenchment)
         self.remove_belief(old_belief)
         self.expand(new_belief, entrenchment)
 
     def convert_to_cnf(self, belief: str) -> str:
         """Convert a belief to simplified CNF form (handles <<>> and ~~)."""
+        # 'p&q' and ' p  & q ' share one cache entry: tokens are re-joined with single spaces
+        key = " ".join(TOKEN_PATTERN.findall(belief))
+        cached = self._cnf_cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
-            match = re.fullmatch(r"(.+?)\s*<<>>\s*(.+)", belief.strip())
+            match = IFF_PATTERN.fullmatch(strip_outer_parens(belief))
             if match:
-                left, right = match.groups()
-                belief = f"({left} >> {right}) & ({right} >> {left})"
-
-            # Parse and simplify logic
-            expr = parse_expr(belief, evaluate=False)
-            simplified_expr = simplify_logic(to_cnf(expr, simplify=True), form='cnf')
-            return str(simplified_expr)
+                # Build both implications from the parsed sides instead of re-lexing a rewritten string
+                left, right = (parse_expr(side, evaluate=False) for side in match.groups())
+                expr = And(Implies(left, right), Implies(right, left))
+            else:
+                expr = parse_expr(belief, evaluate=False)
+            # '(p) >> (q)' parses to the same expression as 'p >> q': reuse its CNF instead of
+            # running simplify_logic again
+            parsed_key = str(expr)
+            cached = self._cnf_cache.get(parsed_key)
+            if cached is None:
+                # simplify_logic returns a minimal CNF, but above 8 atoms it hands back its input
+                # unchanged; only then is a plain to_cnf pass needed
+                cnf = simplify_logic(expr, form='cnf')
+                if not is_cnf(cnf):
+                    cnf = to_cnf(cnf)
+                cached = self._cnf_cache[parsed_key] = str(cnf)
         except Exception as e:
             raise ValueError(f"Invalid formula or unsupported syntax: '{belief}' → {e}")
 
+        self._cnf_cache[key] = cached
+        return cached
+
+    def _canon(self, belief: str) -> str:
+        """Return the stored form of `belief`, so that e.g. 'q & p' finds the stored 'p & q'.
+
+        Unparsable input is returned unchanged and reported as not found by the caller."""
+        if belief in self._beliefs:
+            return belief
+        try:
+            return self.convert_to_cnf(belief)
+        except ValueError:
+            return belief
+
+
+    def clauses_of(self, formula: str) -> list:
+        """Translate a formula into integer CNF clauses using this base's atom numbering."""
+        clauses = self._clause_cache.get(formula)
+        if clauses is None:
+            clauses = self._clause_cache[formula] = to_clauses(formula, self._var_map)
+        return clauses
+
+    def clauses(self) -> frozenset:
+        """Return the integer clauses of all beliefs in the base."""
+        if self._kb_clauses is None:
+            self._kb_clauses = frozenset(
+                clause for belief in self._beliefs for clause in self.clauses_of(belief)
+            )
+        return self._kb_clauses
+
+    def unit_literals(self) -> set:
+        """Return the literals of all unit clauses in the base."""
+        if self._units is None:
+            self._units = {lit for clause in self.clauses() if len(clause) == 1 for lit in clause}
+            self._unit_clash = any(-lit in self._units for lit in self._units)
+        return self._units
+
+    def has_unit_clash(self) -> bool:
+        """Return True if the base contains complementary unit clauses (p and ~p)."""
+        self.unit_literals()
+        return self._unit_clash
+
+    def atom_count(self) -> int:
+        """Return how many atom numbers are in use, so callers can number extra literals above them."""
+        return len(self._var_map)
+
+    def atom_names(self) -> dict:
+        """Return a mapping from each atom number back to its name."""
+        return {var: name for name, var in self._var_map.items()}
+
+    def learned_clauses(self) -> set:
+        """Return the resolvents learned from the base alone in earlier entailment checks."""
+        return self._learned
+
+    def learn(self, clauses):
+        """Keep resolvents derived from the base alone for later entailment checks.
+
+        They are forgotten once a belief is removed."""
+        self._learned.update(clauses)
+
+    def cached_result(self, key) -> Optional[bool]:
+        """Return the remembered entailment result for `key`, or None if there is none."""
+        entailed = self._results.get(key)
+        if entailed is not None:
+            self._results.move_to_end(key)
+        return entailed
+
+    def store_result(self, key, entailed: bool) -> bool:
+        """Remember an entailment result, dropping the least recently used beyond RESULT_CACHE_SIZE."""
+        self._results[key] = entailed
+        if len(self._results) > RESULT_CACHE_SIZE:
+            self._results.popitem(last=False)
+        return entailed
 
     def get_entrenchment(self, belief: str) -> int:
         """Return the entrenchment value of a belief."""
-        for b in self.beliefs:
-            if b[0] == belief:
-                return b[1]
-        raise ValueError(f"Belief not found: {belief}")
+        belief = self._canon(belief)
+        if belief not in self._beliefs:
+            raise ValueError(f"Belief not found: {belief}")
+        return self._beliefs[belief]
+
+
+    def _without(self, excluded: set) -> "BeliefBase":
+        """Return a copy of the base without the `excluded` beliefs.
+
+        The copy shares this base's atom numbering and conversion caches, so its
+        beliefs are never parsed or encoded again."""
+        base = BeliefBase(cache_path=self.cache_path)
+        base._beliefs = {b: e for b, e in self._beliefs.items() if b not in excluded}
+        base._atoms_of = {b: self._atoms_of[b] for b in base._beliefs}
+        base._var_map = self._var_map
+        base._cnf_cache = self._cnf_cache
+        base._clause_cache = self._clause_cache
+        base._results = self._results
+        return base
 
+    def _beliefs_by_atom(self) -> dict:
+        """Return a mapping from each atom to the beliefs that mention it."""
+        if self._atom_index is None:
+            self._atom_index = {}
+            for belief, atoms in self._atoms_of.items():
+                for atom in atoms:
+                    self._atom_index.setdefault(atom, []).append(belief)
+        return self._atom_index
 
-    def contract(self, formula: str):
-        """Remove the least entrenched subset of beliefs so that the belief base no longer entails `formula`."""
-        print(f"Attempting to contract: {formula}")
+    def _relevant_beliefs(self, formula: str) -> set:
+        """Return the beliefs connected to `formula` through (transitively) shared atoms.
+
+        Beliefs outside this set cannot help break the entailment of `formula`,
+        unless they are inconsistent on their own, in which case all beliefs are returned."""
+        beliefs_with_atom = self._beliefs_by_atom()
+
+        # Beliefs without atoms (True/False) are kept; False contradicts everything
+        relevant = {belief for belief, atoms in self._atoms_of.items() if not atoms}
+        queue = deque(atoms_of(formula))
+        seen = set(queue)
+        while queue:
+            for belief in beliefs_with_atom.get(queue.popleft(), ()):
+                if belief not in relevant:
+                    relevant.add(belief)
+                    for atom in self._atoms_of[belief] - seen:
+                        seen.add(atom)
+                        queue.append(atom)
+
+        if len(relevant) < len(self._beliefs):
+            if resolution(self._without(relevant), "True"):
+                return set(self._beliefs)
+        return relevant
+
+    def _entails_without(self, negated: str, excluded: set) -> bool:
+        """Return True if the base still contradicts the negated formula once the `excluded` beliefs are dropped."""
+        return resolution(self._without(excluded), negated)
+
+    def _greedy_contraction(self, negated: str, beliefs: list) -> Optional[tuple]:
+        """Return a subset of `beliefs` whose removal breaks the entailment of a formula, or None.
+
+        `negated` is the negation of that formula, computed once by the caller.
+
+        Beliefs are dropped least entrenched first until the entailment breaks, then the
+        most entrenched ones are restored wherever the entailment stays broken. The result
+        is minimal but not necessarily of the lowest total entrenchment."""
+        removed = set()
+        for belief, _ in sorted(beliefs, key=lambda b: b[1]):
+            removed.add(belief)
+            if not self._entails_without(negated, removed):
+                break
+        else:
+            return None
+
+        for belief, _ in sorted(beliefs, key=lambda b: b[1], reverse=True):
+            if belief in removed and not self._entails_without(negated, removed - {belief}):
+                removed.discard(belief)
+        return tuple(b for b in beliefs if b[0] in removed)
+
+    def contract(self, formula: str, exact: Optional[bool] = None):
+        """Remove the least entrenched subset of beliefs so that the belief base no longer entails `formula`.
+
+        With `exact` the kernels (minimal sets of beliefs that entail `formula`) are found in one
+        saturation and the cheapest set of beliefs meeting all of them is removed, otherwise a
+        greedy removal with O(n) entailment checks is used. By default the exact search is used
+        for up to EXACT_CONTRACTION_LIMIT relevant beliefs."""
+        log.info("Attempting to contract: %s", formula)
 
         # Step 1: Check if formula is entailed
         negated = negate_formula(formula, self)
         if not resolution(self, negated):
-            print("Formula not entailed — no contraction needed.")
+            log.info("Formula not entailed — no contraction needed.")
             return  # Nothing to contract
 
-        original_beliefs = list(self.beliefs)
-        successful_subsets = []
-
-        # Step 2: Try all subsets of the belief base
-        for r in range(1, len(original_beliefs) + 1):
-            for subset in combinations(original_beliefs, r):
-                # Build a temporary base excluding this subset
-                temp_base = BeliefBase()
-                for b in original_beliefs:
-                    if b not in subset:
-                        temp_base.expand(b[0], b[1])
-
-                if not resolution(temp_base, negate_formula(formula, temp_base)):
-                    # Store subset and its total entrenchment
-                    total_entrenchment = sum(b[1] for b in subset)
-                    successful_subsets.append((subset, total_entrenchment))
-
-        if not successful_subsets:
-            print("No suitable contraction found — base may be inconsistent or minimal.")
+        # Only beliefs sharing atoms with the formula can matter
+        relevant = self._relevant_beliefs(formula)
+        original_beliefs = [b for b in self.beliefs if b[0] in relevant]
+        if exact is None:
+            exact = len(original_beliefs) <= EXACT_CONTRACTION_LIMIT
+
+        # Step 2: Find the beliefs to give up
+        if exact:
+            # One saturation finds every minimal set of beliefs entailing the formula;
+            # removing a subset breaks the entailment exactly when it meets all of them
+            relevant_base = self._without(set(self._beliefs) - relevant)
+            entailing = kernels(relevant_base, negated)
+            # The cheapest hitting set never contains a belief outside every kernel
+            in_kernels = set().union(*entailing)
+            candidates = [b for b in original_beliefs if b[0] in in_kernels]
+            # Candidates and kernels become bitmasks over candidate positions
+            position = {belief: i for i, (belief, _) in enumerate(candidates)}
+            kernel_masks = [sum(1 << position[belief] for belief in kernel) for kernel in entailing]
+            best_mask = cheapest_hitting_set(kernel_masks, [b[1] for b in candidates])
+            best_subset = None if best_mask is None else tuple(
+                b for i, b in enumerate(candidates) if best_mask >> i & 1
+            )
+        else:
+            best_subset = self._greedy_contraction(negated, original_beliefs)
+
+        if best_subset is None:
+            log.info("No suitable contraction found — base may be inconsistent or minimal.")
             return
 
-        # Step 3: Pick the subset with the lowest total entrenchment
-        best_subset, min_score = min(successful_subsets, key=lambda x: x[1])
-        print(f"Removing {len(best_subset)} beliefs (lowest entrenchment: {min_score}) to break entailment of '{formula}':")
+        # Step 3: Remove the chosen subset
+        score = sum(b[1] for b in best_subset)
+        log.info("Removing %d beliefs (total entrenchment: %s) to break entailment of '%s':", len(best_subset), score, formula)
         for belief in best_subset:
-            print(f" - {belief[0]} (entrenchment: {belief[1]})")
+            log.info(" - %s (entrenchment: %s)", belief[0], belief[1])
             self.remove_belief(belief[0])
 
 
     def revise(self, formula: str, entrenchment: int = 50):
         """Revise the belief base with a new belief `formula`, ensuring consistency."""
-        print(f"Revising belief base with: {formula}")
+        # Checked before contracting so that a rejected revision leaves the base unchanged
+        self._check_entrenchment(entrenchment)
+        log.info("Revising belief base with: %s", formula)
         negated = negate_formula(formula, self)
 
         # Step 1: Contract the negation of the formula
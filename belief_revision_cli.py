@@ -36,12 +36,6 @@ Formula syntax:
         """expand <formula> [<entrenchment>]: Add a belief to the belief base (expansion)."""
         formula, entrenchment = self._parse_formula_arg(arg)
         try:
-            if "<<" in formula and ">>" in formula:
-                parts = formula.split("<<>>")
-                if len(parts) == 2:
-                    left = parts[0].strip()
-                    right = parts[1].strip()
-                    formula = f"({left} >> {right}) & ({right} >> {left})"
             cnf = self.belief_base.convert_to_cnf(formula)
             self.belief_base.expand(cnf, entrenchment)
             print(
@@ -53,12 +47,6 @@ Formula syntax:
         """revise <formula> [<entrenchment>]: Revise belief base using contraction and expansion."""
         formula, entrenchment = self._parse_formula_arg(arg)
         try:
-            if "<<" in formula and ">>" in formula:
-                parts = formula.split("<<>>")
-                if len(parts) == 2:
-                    left = parts[0].strip()
-                    right = parts[1].strip()
-                    formula = f"({left} >> {right}) & ({right} >> {left})"
             cnf = self.belief_base.convert_to_cnf(formula)
             self.belief_base.revise(cnf, entrenchment)
             print(
@@ -69,12 +57,6 @@ Formula syntax:
     def do_entails(self, arg):
         """entails <formula>: Check if belief base logically entails the given formula."""
         formula = arg.strip()
-        if "<<" in formula and ">>" in formula:
-            parts = formula.split("<<>>")
-            if len(parts) == 2:
-                left = parts[0].strip()
-                right = parts[1].strip()
-                formula = f"({left} >> {right}) & ({right} >> {left})"
         try:
             negated = negate_formula(formula, self.belief_base)
             if resolution(self.belief_base, negated):
@@ -1,3 +1,5 @@
+import logging
+import sys
 from belief_base import BeliefBase
 from resolution import negate_formula, resolution
 
@@ -121,6 +123,7 @@ def demonstrate_revision():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
     demonstrate_task1()
     demonstrate_task2()
     demonstrate_task3()
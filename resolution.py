@@ -1,158 +1,449 @@
+import hashlib
+import logging
+import re
+import shelve
+from collections import deque
 import sympy
 from sympy.logic.boolalg import to_cnf
 
 """Implementation of the resolution algorithm for propositional logic."""
 
+log = logging.getLogger(__name__)
+
+CNF_LITERAL = re.compile(r"(~?)\s*(?!True\b|False\b)([A-Za-z_]\w*)")
+
 def negate_formula(formula, belief_base):
-    """Negate the formula and apply De Morgan's laws if needed."""
-    if "&" in formula:
-        # Apply De Morgan's law for conjunctions: ~(p&q) = ~p | ~q
-        terms = formula.split("&")
-        negated_terms = [f"~{term.strip()}" for term in terms]
-        negated_formula = " | ".join(negated_terms)
-    elif "|" in formula:
-        # Apply De Morgan's law for disjunctions: ~(p|q) = ~p & ~q
-        terms = formula.split("|")
-        negated_terms = [f"~{term.strip()}" for term in terms]
-        negated_formula = " & ".join(negated_terms)
+    """Negate the formula through its CNF.
+
+    A single clause (l1 | l2 | ...) negates by De Morgan's laws to the unit clauses
+    ~l1 & ~l2 & ..., with no further sympy call. Several clauses would negate to a DNF,
+    whose Tseitin encoding saturates slowly, so those are converted back to CNF instead."""
+    cnf = belief_base.convert_to_cnf(formula)
+    clauses = parse_cnf(cnf)
+    if cnf in ("True", "False"):
+        negated_formula = "False" if cnf == "True" else "True"
+    elif clauses is not None and len(clauses) == 1:
+        negated_formula = " & ".join(atom if negated else f"~{atom}" for atom, negated in clauses[0])
     else:
-        # Simple negation for atomic formulas
-        negated_formula = f"~{formula}"
-    
-    # Convert to CNF
-    negated_formula = belief_base.convert_to_cnf(negated_formula)
-    print(f"Negated formula: {negated_formula}")
+        # Several clauses, or anything not in plain CNF, are negated by sympy (cached per string)
+        negated_formula = belief_base.convert_to_cnf(f"~({cnf})")
+    log.debug("Negated formula: %s", negated_formula)
     return negated_formula
 
 def get_literals(clause):
-    """Extract literals from a clause."""
-    if isinstance(clause, sympy.Symbol):
-        return {clause}
-    elif isinstance(clause, sympy.Not) and isinstance(clause.args[0], sympy.Symbol):
-        return {clause}
-    elif isinstance(clause, sympy.Or):
-        literals = set()
-        for arg in clause.args:
-            literals.update(get_literals(arg))
-        return literals
-    elif isinstance(clause, sympy.And):
-        # For conjunctions, each conjunct should be treated as a separate clause
-        # We don't combine AND clauses in resolution
-        return {clause}  # Return the entire conjunction as a single unit
-    return {clause}
-
-def resolve(clause1, clause2, belief_base):
-    """Check complementary literals and return resolvent."""
-    # Convert to SymPy CNF objects
-    clause1_expr = to_cnf(clause1, simplify=True)
-    clause2_expr = to_cnf(clause2, simplify=True)
-    
-    print(f"Clause1: {clause1_expr}")
-    print(f"Clause2: {clause2_expr}")
-    
-    print(f"Resolving clauses: {clause1_expr} and {clause2_expr}")
-    
-    # Handle AND expressions - in CNF, we treat each conjunct separately
-    if isinstance(clause1_expr, sympy.And):
-        for arg in clause1_expr.args:
-            result = resolve(arg, clause2_expr, belief_base)
-            if result == "":  # Empty clause found
-                return ""
-            if result is not None:
-                return result
-        return None
-    
-    if isinstance(clause2_expr, sympy.And):
-        for arg in clause2_expr.args:
-            result = resolve(clause1_expr, arg, belief_base)
-            if result == "":  # Empty clause found
-                return ""
-            if result is not None:
-                return result
-        return None
-    
-    # Now we're dealing with disjunctions (OR) or literals
-    literals1 = get_literals(clause1_expr)
-    literals2 = get_literals(clause2_expr)
-    
-    print(f"Literals in clause1: {literals1}, clause2: {literals2}")
-    
-    # Check for complementary literals
-    for literal in literals1:
-        print(f"Checking literal: {literal}")
-        if isinstance(literal, sympy.Not) and isinstance(literal.args[0], sympy.Symbol):
-            # If literal is negated, check for positive form in literals2
-            positive_form = literal.args[0]
-            for lit2 in literals2:
-                if lit2 == positive_form:
-                    # Complementary literals found, compute resolvent
-                    resolvent_literals1 = literals1 - {literal}
-                    resolvent_literals2 = literals2 - {lit2}
-                    resolvent = resolvent_literals1.union(resolvent_literals2)
-                    
-                    if not resolvent:
-                        return ""  # Empty clause - contradiction found
-                    
-                    if len(resolvent) == 1:
-                        return next(iter(resolvent))
-                    else:
-                        return sympy.Or(*resolvent)
-        elif isinstance(literal, sympy.Symbol):
-            # If literal is positive, check for negated form in literals2
-            for lit2 in literals2:
-                if isinstance(lit2, sympy.Not) and lit2.args[0] == literal:
-                    # Complementary literals found, compute resolvent
-                    resolvent_literals1 = literals1 - {literal}
-                    resolvent_literals2 = literals2 - {lit2}
-                    resolvent = resolvent_literals1.union(resolvent_literals2)
-                    
-                    if not resolvent:
-                        return ""  # Empty clause - contradiction found
-                    
-                    if len(resolvent) == 1:
-                        return next(iter(resolvent))
-                    else:
-                        return sympy.Or(*resolvent)
-    
-    # No complementary literals found
-    return None
+    """Extract literals from a clause.
+
+    Nested disjunctions (left unflattened by evaluate=False) are walked with a stack;
+    any other disjunct, including a conjunction, is kept whole as a single unit."""
+    literals = set()
+    stack = [clause]
+    while stack:
+        expr = stack.pop()
+        if isinstance(expr, sympy.Or):
+            stack.extend(expr.args)
+        else:
+            literals.add(expr)
+    return literals
+
+def _tseitin_literal(expr, var_map, clauses):
+    """Return the literal standing for `expr`, adding Tseitin definition clauses for compound subformulas.
+
+    A fresh auxiliary variable z is introduced per compound subexpression, e.g.
+    z <-> (x & y) adds (~z | x), (~z | y) and (z | ~x | ~y), so the clause count
+    stays linear in the formula size."""
+    if isinstance(expr, sympy.Symbol):
+        return var_map.setdefault(str(expr), len(var_map) + 1)
+    if isinstance(expr, sympy.Not):
+        return -_tseitin_literal(expr.args[0], var_map, clauses)
+    if isinstance(expr, sympy.Implies):
+        expr = sympy.Or(sympy.Not(expr.args[0]), expr.args[1], evaluate=False)
+    elif isinstance(expr, sympy.Equivalent) and len(expr.args) > 2:
+        first = expr.args[0]
+        expr = sympy.And(*(sympy.Equivalent(first, other) for other in expr.args[1:]), evaluate=False)
+    elif not isinstance(expr, (sympy.And, sympy.Or, sympy.Equivalent)):
+        expr = to_cnf(expr)  # Any other connective (e.g. Xor) is rewritten first
+
+    args = [_tseitin_literal(arg, var_map, clauses) for arg in expr.args]
+    # Auxiliary names start with '#' so they can never clash with a formula atom
+    aux = len(var_map) + 1
+    var_map[f"#{aux}"] = aux
+    if isinstance(expr, sympy.And):
+        clauses.extend(frozenset({-aux, arg}) for arg in args)
+        clauses.append(frozenset([aux] + [-arg for arg in args]))
+    elif isinstance(expr, sympy.Or):
+        clauses.extend(frozenset({aux, -arg}) for arg in args)
+        clauses.append(frozenset([-aux] + args))
+    else:  # Equivalent(a, b)
+        a, b = args
+        clauses.extend([
+            frozenset({-aux, -a, b}), frozenset({-aux, a, -b}),
+            frozenset({aux, a, b}), frozenset({aux, -a, -b}),
+        ])
+    return aux
+
+def parse_cnf(formula):
+    """Split a plain CNF string such as '(p | ~q) & r' into clauses of (atom, negated) pairs.
+
+    Returns None for anything else (other connectives, nesting, constants), which
+    then goes through sympy instead."""
+    clauses = []
+    conjuncts = formula.split("&")
+    for conjunct in conjuncts:
+        conjunct = conjunct.strip()
+        if conjunct.startswith("(") and conjunct.endswith(")"):
+            conjunct = conjunct[1:-1]
+        elif len(conjuncts) > 1 and "|" in conjunct:
+            # '&' binds tighter than '|', so 'p | q & r' is not the CNF '(p | q) & r'
+            return None
+        clause = []
+        for literal in conjunct.split("|"):
+            match = CNF_LITERAL.fullmatch(literal.strip())
+            if match is None:
+                return None
+            clause.append((match.group(2), bool(match.group(1))))
+        clauses.append(clause)
+    return clauses
+
+def to_clauses(formula, var_map):
+    """Translate a formula into CNF clauses over signed integer literals.
+
+    Each atom is assigned a positive integer in `var_map` (p -> k, ~p -> -k),
+    so a clause is a frozenset of ints and the empty frozenset is the empty clause.
+    Stored beliefs are already CNF and map one-to-one onto clauses; other formulas
+    are encoded with the Tseitin transformation instead of an exponential to_cnf."""
+    # Stored beliefs and their negations are plain CNF strings; read those without sympy
+    parsed = parse_cnf(formula)
+    if parsed is not None:
+        return [
+            frozenset(
+                -var_map.setdefault(atom, len(var_map) + 1) if negated
+                else var_map.setdefault(atom, len(var_map) + 1)
+                for atom, negated in clause
+            )
+            for clause in parsed
+        ]
+
+    expr = sympy.sympify(formula)
+    if expr in (True, sympy.true):
+        return []
+    if expr in (False, sympy.false):
+        return [frozenset()]
+
+    conjuncts = expr.args if isinstance(expr, sympy.And) else (expr,)
+    clauses = []
+    for conjunct in conjuncts:
+        if isinstance(conjunct, sympy.Implies):
+            conjunct = sympy.Or(sympy.Not(conjunct.args[0]), conjunct.args[1], evaluate=False)
+        clause = frozenset(
+            _tseitin_literal(literal, var_map, clauses) for literal in get_literals(conjunct)
+        )
+        clauses.append(clause)
+    return clauses
+
+def resolve(clause1, clause2):
+    """Check complementary literals and return resolvent.
+    Returns None if the clauses do not resolve, or only to a tautology because they clash
+    on more than one atom (e.g. p | q and ~p | ~q); an empty frozenset is the empty clause."""
+    # Scan the shorter clause and stop at a second clash
+    smaller, larger, sign = (clause1, clause2, 1) if len(clause1) <= len(clause2) else (clause2, clause1, -1)
+    literal = None
+    for candidate in smaller:
+        if -candidate in larger:
+            if literal is not None:
+                return None  # Every resolvent keeps a complementary pair
+            literal = candidate * sign
+    if literal is None:
+        return None  # No complementary literals
+
+    log.debug("Resolving clauses: %s and %s", clause1, clause2)
+    return (clause1 - {literal}) | (clause2 - {-literal})
+
+def clause_set_key(clauses, names):
+    """Return a stable digest of a clause set, independent of atom numbering and order.
+
+    `names` maps each atom number to its name."""
+    canonical = sorted(
+        tuple(sorted(f"~{names[-lit]}" if lit < 0 else names[lit] for lit in clause))
+        for clause in clauses
+    )
+    return hashlib.blake2b(repr(canonical).encode()).hexdigest()
+
+def clause_masks(clause):
+    """Return the (positive, negative) bitmasks of a clause, with bit k standing for atom k."""
+    pos = neg = 0
+    for literal in clause:
+        if literal > 0:
+            pos |= 1 << literal
+        else:
+            neg |= 1 << -literal
+    return pos, neg
+
+def unit_propagate(masks):
+    """Run unit propagation over (positive, negative) clause bitmasks.
+    Returns True if a clause is falsified, False if every clause is satisfied, None otherwise."""
+    true = false = 0
+    pending = list(masks)
+    changed = True
+    while changed:
+        changed = False
+        still_open = []
+        for pos, neg in pending:
+            if pos & neg or pos & true or neg & false:
+                continue  # Tautology or already satisfied
+            pos &= ~false
+            neg &= ~true
+            remaining = pos | neg
+            if not remaining:
+                return True  # Every literal is false
+            if remaining & (remaining - 1) == 0:
+                # Exactly one literal left: it must be true
+                true |= pos
+                false |= neg
+                changed = True
+            else:
+                still_open.append((pos, neg))
+        pending = still_open
+    return None if pending else False
+
+def remove_subsumed(masks):
+    """Return the clauses of a {clause: masks} mapping that are neither tautologies nor subsumed."""
+    candidates = [(clause, pos, neg) for clause, (pos, neg) in masks.items() if not pos & neg]
+    kept = set()
+    for clause, pos, neg in candidates:
+        if not any(
+            other is not clause and not (other_pos & ~pos or other_neg & ~neg)
+            for other, other_pos, other_neg in candidates
+        ):
+            kept.add(clause)
+    return kept
+
+def remove_pure(masks, clauses):
+    """Return `clauses` without those containing a pure literal (one whose negation occurs nowhere).
+
+    Such clauses can always be satisfied by that literal, so dropping them keeps the
+    set's satisfiability; this is repeated until no pure literal is left."""
+    clauses = set(clauses)
+    while clauses:
+        all_pos = all_neg = 0
+        for clause in clauses:
+            pos, neg = masks[clause]
+            all_pos |= pos
+            all_neg |= neg
+        pure_pos, pure_neg = all_pos & ~all_neg, all_neg & ~all_pos
+        if not pure_pos and not pure_neg:
+            break
+        clauses = {
+            clause for clause in clauses
+            if not (masks[clause][0] & pure_pos or masks[clause][1] & pure_neg)
+        }
+    return clauses
+
+def _given_clause(masks, unprocessed):
+    """Run the given-clause loop: each clause taken from `unprocessed` is resolved once against the processed ones.
+
+    `masks` maps the live clauses to their bitmasks; resolvents that are subsumed are dropped,
+    clauses a new resolvent subsumes are deleted from it, and clauses it can shorten by
+    subsumption resolution are replaced. Yields (clause, parent, parent) for every kept
+    resolvent or shortened clause after adding it, and stops after yielding the empty clause."""
+    # Processed clauses indexed by literal (dicts as insertion-ordered sets), so the given
+    # clause only meets clauses holding the complement of one of its literals
+    processed = {}
+    # Every live clause indexed by literal, for subsumption checks
+    occurs = {}
+    for clause in masks:
+        for lit in clause:
+            occurs.setdefault(lit, {})[clause] = None
+
+    def forget(clause):
+        del masks[clause]
+        for lit in clause:
+            del occurs[lit][clause]
+            processed.get(lit, {}).pop(clause, None)
+
+    while unprocessed:
+        given = unprocessed.popleft()
+        if given not in masks:
+            continue  # Subsumed while waiting
+        given_pos, given_neg = masks[given]
+        candidates = dict.fromkeys(other for lit in given for other in processed.get(-lit, ()))
+        for other in candidates:
+            if other not in masks:
+                continue
+            other_pos, other_neg = masks[other]
+            # Bits of the atoms the two clauses clash on; as in resolve(), exactly one is needed
+            clash = given_pos & other_neg | given_neg & other_pos
+            if not clash or clash & (clash - 1):
+                continue
+            log.debug("Resolving clauses: %s and %s", given, other)
+            # The single clash bit names the atom to resolve upon
+            atom = clash.bit_length() - 1
+            literal = atom if given_pos & clash else -atom
+            resolvent = (given - {literal}) | (other - {-literal})
+            pending = [(
+                resolvent, (given_pos | other_pos) & ~clash, (given_neg | other_neg) & ~clash,
+                given, other,
+            )]
+            while pending:
+                clause, pos, neg, left, right = pending.pop()
+                if not clause:
+                    yield clause, left, right
+                    return
+                # Drop clauses subsumed by a clause we already have; such a clause shares
+                # a literal with them (a single clash never leaves a tautology)
+                if any(
+                    not (masks[kept][0] & ~pos or masks[kept][1] & ~neg)
+                    for lit in clause for kept in occurs.get(lit, ())
+                ):
+                    continue
+                # Drop the clauses that the new clause subsumes; they all hold its rarest literal
+                rarest = min(clause, key=lambda lit: len(occurs.get(lit, ())))
+                for subsumed in [
+                    kept for kept in occurs.get(rarest, ())
+                    if not (pos & ~masks[kept][0] or neg & ~masks[kept][1])
+                ]:
+                    forget(subsumed)
+                # Subsumption resolution: a clause holding ~lit and the rest of the new clause
+                # is replaced by itself without ~lit, their resolvent, which subsumes it
+                for lit in clause:
+                    bit = 1 << abs(lit)
+                    rest_pos, rest_neg = (pos & ~bit, neg) if lit > 0 else (pos, neg & ~bit)
+                    for shortened in [
+                        kept for kept in occurs.get(-lit, ())
+                        if not (rest_pos & ~masks[kept][0] or rest_neg & ~masks[kept][1])
+                    ]:
+                        kept_pos, kept_neg = masks[shortened]
+                        forget(shortened)
+                        pending.append((
+                            shortened - {-lit}, kept_pos & ~bit, kept_neg & ~bit, clause, shortened,
+                        ))
+                masks[clause] = (pos, neg)
+                for lit in clause:
+                    occurs.setdefault(lit, {})[clause] = None
+                unprocessed.append(clause)
+                yield clause, left, right
+        if given in masks:
+            for lit in given:
+                processed.setdefault(lit, {})[given] = None
+
+def _saturate(belief_base, kb_clauses, support):
+    """Saturate the clause set by resolution. Returns True once the empty clause is derived."""
+    # Resolvents learned from the base in earlier calls are reused as a head start
+    clauses = kb_clauses | support | belief_base.learned_clauses()
+
+    if frozenset() in clauses:
+        log.debug("Empty clause (contradiction) found!")
+        return True
+
+    # Cheap bitmask pre-filter: many queries are decided by unit propagation alone
+    masks = {clause: clause_masks(clause) for clause in clauses}
+    decided = unit_propagate(masks.values())
+    if decided is not None:
+        log.debug("Decided by unit propagation: %s", "contradiction found!" if decided else "satisfiable.")
+        return decided
+    # Horn clauses (at most one positive literal) that survive unit propagation are satisfied
+    # by making every unassigned atom false, so no resolution is needed
+    if all(pos & (pos - 1) == 0 for pos, _ in masks.values()):
+        log.debug("Decided by unit propagation on Horn clauses: satisfiable.")
+        return False
+    clauses = remove_pure(masks, remove_subsumed(masks))
+    if not clauses:
+        log.debug("Decided by pure literal elimination: satisfiable.")
+        return False
+    # Live clauses and their bitmasks; subsumed clauses are deleted from here
+    masks = {clause: masks[clause] for clause in clauses}
+
+    # Clauses of the negated formula are selected first (set of support), shortest first
+    unprocessed = deque(sorted(clauses, key=lambda clause: (clause not in support, len(clause))))
+    try:
+        for resolvent, given, other in _given_clause(masks, unprocessed):
+            # Empty resolvent indicates a contradiction
+            if not resolvent:
+                log.debug("Empty clause (contradiction) found!")
+                return True  # Entailment found via contradiction
+            if given in support or other in support:
+                support.add(resolvent)
+            else:
+                support.discard(resolvent)
+        log.debug("No new clauses generated, resolution complete.")
+    finally:
+        belief_base.learn(masks.keys() - support - kb_clauses)
+
+    # If no contradiction is found, the negated formula is not entailed
+    log.debug("No contradiction found.")
+    return False
+
+def kernels(belief_base, negated_formula):
+    """Return the minimal sets of beliefs that contradict `negated_formula`, i.e. that entail the formula.
+
+    All subsets are answered by one saturation: every clause of a belief carries that
+    belief's selector literal ~s, like an assumption literal in a SAT solver. Selectors
+    only occur negated, so they are never resolved upon, and a derived clause made of
+    selectors alone names beliefs that together entail the formula. Subsumption keeps
+    only the minimal ones. An empty set is returned if the formula is a tautology."""
+    negated_clauses = set(belief_base.clauses_of(negated_formula))
+    # Selector numbers start above every atom, so they never enter the shared var_map
+    first = belief_base.atom_count() + 1
+    selectors = {first + i: belief for i, (belief, _) in enumerate(belief_base.beliefs)}
+    clauses = set(negated_clauses)
+    for selector, belief in selectors.items():
+        clauses.update(clause | {-selector} for clause in belief_base.clauses_of(belief))
+
+    masks = {clause: clause_masks(clause) for clause in clauses}
+    clauses = remove_subsumed(masks)
+    masks = {clause: masks[clause] for clause in clauses}
+    unprocessed = deque(sorted(clauses, key=lambda clause: (clause not in negated_clauses, len(clause))))
+    for resolvent, _, _ in _given_clause(masks, unprocessed):
+        if not resolvent:
+            return [set()]
+
+    atom_bits = (1 << first) - 1
+    return [
+        {selectors[-lit] for lit in clause}
+        for clause, (pos, neg) in masks.items()
+        if not (pos | neg) & atom_bits
+    ]
+
 def resolution(belief_base, negated_formula):
     """Apply resolution to the belief base and negated formula.
     Returns True if the negated formula is entailed (contradiction found), False otherwise."""
 
     try:
-        # Convert initial clauses to a set to avoid duplicates
-        clauses = set(belief[0] for belief in belief_base.beliefs)
-        clauses.add(negated_formula)
-        
-        # Iterate until no new clauses can be generated
-        while True:
-            new_clauses = set()
-            
-            # Try to resolve all pairs of clauses
-            all_clauses = list(clauses)  # Convert to list for indexing
-            for i in range(len(all_clauses)):
-                for j in range(i + 1, len(all_clauses)):
-                    resolvent = resolve(all_clauses[i], all_clauses[j], belief_base)
-                    if resolvent is not None:
-                        # Empty resolvent indicates a contradiction
-                        if resolvent == "":
-                            print("Empty clause (contradiction) found!")
-                            return True  # Entailment found via contradiction
-                        new_clauses.add(resolvent)
-            
-            # Add new clauses to the set
-            original_size = len(clauses)
-            clauses.update(new_clauses)
-            
-            # If no new clauses were added, stop
-            if len(clauses) == original_size:
-                print("No new clauses generated, resolution complete.")
-                break
-
-        # If no contradiction is found, the negated formula is not entailed
-        print("No contradiction found.")
-        return False
+        # Beliefs are encoded at insertion and their clause set kept until the base changes
+        kb_clauses = belief_base.clauses()
+        negated_clauses = set(belief_base.clauses_of(negated_formula))
+
+        # Complementary unit clauses (p and ~p) contradict directly, no saturation needed
+        # The base's own clash is computed once per change; only the query's units are scanned here
+        units = belief_base.unit_literals()
+        query_units = {lit for clause in negated_clauses if len(clause) == 1 for lit in clause}
+        if belief_base.has_unit_clash() or any(
+            -lit in units or -lit in query_units for lit in query_units
+        ):
+            log.debug("Complementary unit clauses (contradiction) found!")
+            return True
+
+        # Repeated probes of the same clause set (e.g. consistency checks) are answered from memory
+        memo_key = (kb_clauses, negated_formula)
+        entailed = belief_base.cached_result(memo_key)
+        if entailed is not None:
+            return entailed
+
+        cache_key = None
+        if belief_base.cache_path:
+            cache_key = clause_set_key(kb_clauses | negated_clauses, belief_base.atom_names())
+            with shelve.open(belief_base.cache_path) as cache:
+                if cache_key in cache:
+                    log.debug("Using cached entailment result.")
+                    return belief_base.store_result(memo_key, cache[cache_key])
+
+        # Clauses that depend on the negated formula; all others follow from the base alone
+        entailed = _saturate(belief_base, kb_clauses, negated_clauses - kb_clauses)
+        belief_base.store_result(memo_key, entailed)
+
+        if cache_key is not None:
+            with shelve.open(belief_base.cache_path) as cache:
+                cache[cache_key] = entailed
+        return entailed
     except Exception as e:
-        print(f"Error during entailment check: {str(e)}")
+        log.error("Error during entailment check: %s", e)
         return False
@@ -1,7 +1,11 @@
+import logging
+import sys
 from belief_revision_cli import BeliefRevisionCLI
 
 
 def main():
+    # Contraction steps are reported at INFO; set DEBUG to trace every resolution step
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
     BeliefRevisionCLI().cmdloop()
 
 
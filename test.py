@@ -1,6 +1,11 @@
+import os
+import tempfile
 import unittest
-from belief_base import BeliefBase
-from resolution import negate_formula, resolution
+from unittest import mock
+from sympy.logic.boolalg import simplify_logic
+from belief_base import BeliefBase, cheapest_hitting_set
+import resolution as resolution_module
+from resolution import kernels, negate_formula, resolution, resolve
 
 
 class TestBeliefBase(unittest.TestCase):
@@ -21,10 +26,26 @@ class TestBeliefBase(unittest.TestCase):
         # It expands to conjunction of implications
         self.assertIn("|", cnf_equiv)
 
+    def test_cnf_conversion_many_atoms(self):
+        # simplify_logic leaves formulas over more than 8 atoms unchanged
+        cnf = self.base.convert_to_cnf("(a & b & c & d & e) >> (f | g | h | i)")
+        self.assertEqual(cnf, "f | g | h | i | ~a | ~b | ~c | ~d | ~e")
+        self.base.expand("(a & b & c & d & e) >> (f | g | h | i)", 30)
+        self.base.expand("a & b & c & d & e", 30)
+        self.assertTrue(resolution(self.base, negate_formula("f | g | h | i", self.base)))
+
     def test_entrenchment(self):
         self.base.expand("r", 35)
         self.assertEqual(self.base.get_entrenchment("r"), 35)
 
+    def test_negative_entrenchment(self):
+        with self.assertRaises(ValueError):
+            self.base.expand("p", -1)
+        self.base.expand("q", 10)
+        with self.assertRaises(ValueError):
+            self.base.update_belief("q", "r", -5)
+        self.assertEqual(self.base.beliefs, [("q", 10)])
+
     def test_remove_existing_belief(self):
         self.base.expand("s", 15)
         self.base.remove_belief("s")
@@ -44,6 +65,31 @@ class TestBeliefBase(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.base.get_entrenchment("x")
 
+    def test_expand_duplicate_belief(self):
+        self.base.expand("p & q", 10)
+        self.base.expand("p & q", 30)
+        self.assertEqual(len(self.base.beliefs), 1)
+        self.assertEqual(self.base.get_entrenchment("p & q"), 30)
+
+    def test_syntactic_variants_find_stored_belief(self):
+        self.base.expand("p & q", 10)
+        self.assertEqual(self.base.get_entrenchment("q&p"), 10)
+        self.base.remove_belief(" q  & p ")
+        self.assertEqual(len(self.base.beliefs), 0)
+
+    def test_cnf_cache_shared_by_parenthesised_variants(self):
+        calls = []
+
+        def counting_simplify_logic(*args, **kwargs):
+            calls.append(args)
+            return simplify_logic(*args, **kwargs)
+
+        with mock.patch("belief_base.simplify_logic", counting_simplify_logic):
+            cnf = self.base.convert_to_cnf("p >> q")
+            # Same parsed expression: answered from the cache without another simplification
+            self.assertEqual(self.base.convert_to_cnf("((p >> q))"), cnf)
+        self.assertEqual(len(calls), 1)
+
     def test_add_contradictory_beliefs(self):
         self.base.expand("p", 20)
         self.base.expand("~p", 30)
@@ -81,6 +127,47 @@ class TestBeliefBase(unittest.TestCase):
         self.base.contract("z")
         self.assertEqual(len(self.base.beliefs), 1)
 
+    def test_contract_ignores_unrelated_beliefs(self):
+        self.base.expand("p", 20)
+        self.base.expand("p >> q", 40)
+        self.base.expand("r", 10)
+        self.base.contract("q")
+        beliefs = [b[0] for b in self.base.beliefs]
+        self.assertIn("r", beliefs)
+        self.assertNotIn("p", beliefs)
+
+    def test_contract_inconsistent_unrelated_beliefs(self):
+        self.base.expand("x", 10)
+        self.base.expand("~x", 20)
+        self.base.expand("p", 50)
+        # q is only entailed because x and ~x contradict each other
+        self.base.contract("q")
+        beliefs = [b[0] for b in self.base.beliefs]
+        self.assertEqual(beliefs, ["~x", "p"])
+
+    def test_contract_greedy(self):
+        self.base.expand("q >> p", 10)
+        self.base.expand("p", 20)
+        self.base.contract("p", exact=False)
+        # q >> p is dropped first but restored once p alone turns out to suffice
+        self.assertEqual([b[0] for b in self.base.beliefs], ["p | ~q"])
+
+    def test_kernels(self):
+        self.base.expand("p", 20)
+        self.base.expand("p >> q", 40)
+        self.base.expand("q", 60)
+        self.base.expand("r", 10)
+        found = kernels(self.base, negate_formula("q", self.base))
+        self.assertCountEqual(found, [{"q"}, {"p", "q | ~p"}])
+
+    def test_cheapest_hitting_set(self):
+        # Kernels {0, 1} and {1, 2}: item 1 alone (30) loses to items 0 and 2 (10 + 10)
+        self.assertEqual(cheapest_hitting_set([0b011, 0b110], [10, 30, 10]), 0b101)
+        # On a tie in cost the smaller set wins, then the one with earlier items
+        self.assertEqual(cheapest_hitting_set([0b011, 0b110], [10, 20, 10]), 0b010)
+        self.assertEqual(cheapest_hitting_set([0b011], [10, 10]), 0b001)
+        self.assertIsNone(cheapest_hitting_set([0b011, 0], [10, 20]))
+
     def test_revision_adds_and_removes(self):
         self.base.expand("p", 30)
         self.base.expand("p >> q", 50)
@@ -98,6 +185,97 @@ class TestBeliefBase(unittest.TestCase):
         negated_q = negate_formula("q", self.base)
         self.assertTrue(resolution(self.base, negated_q))  # Should entail q
 
+    def test_entailment_after_removal(self):
+        self.base.expand("p", 20)
+        self.base.expand("p >> q", 30)
+        self.assertTrue(resolution(self.base, negate_formula("q", self.base)))
+        # Resolvents learned while p was believed must not outlive it
+        self.base.remove_belief("p")
+        self.assertFalse(resolution(self.base, negate_formula("q", self.base)))
+
+    def test_entailment_memo_is_bounded(self):
+        self.base.expand("p", 20)
+        saturated = []
+        with mock.patch("belief_base.RESULT_CACHE_SIZE", 2):
+            with mock.patch("resolution._saturate", wraps=resolution_module._saturate) as saturate:
+                for atom in ("q", "r", "q", "s", "q", "r"):
+                    self.assertFalse(resolution(self.base, negate_formula(atom, self.base)))
+                    if saturate.called:
+                        saturated.append(atom)
+                    saturate.reset_mock()
+        # Repeats are answered from memory, but s pushed out r, the least recently used result
+        self.assertEqual(saturated, ["q", "r", "s", "r"])
+
+    def test_persistent_entailment_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = os.path.join(tmp, "entailment")
+            for run in range(2):
+                base = BeliefBase(cache_path=cache_path)
+                base.expand("p", 20)
+                base.expand("p >> q", 30)
+                with mock.patch("resolution._saturate", wraps=resolution_module._saturate) as saturate:
+                    self.assertTrue(resolution(base, negate_formula("q", base)))
+                    self.assertFalse(resolution(base, negate_formula("r", base)))
+                # The second base answers both queries from disk without saturating
+                self.assertEqual(saturate.call_count, 2 if run == 0 else 0)
+
+    def test_entailment_of_nested_formula(self):
+        self.base.expand("p", 20)
+        self.base.expand("p >> q", 30)
+        # Non-CNF queries are Tseitin-encoded rather than expanded by to_cnf
+        self.assertTrue(resolution(self.base, "~((p & q) | (r >> s))"))
+        self.assertTrue(resolution(self.base, "~(q & (r >> q))"))
+        self.assertFalse(resolution(self.base, "Equivalent(q, ~r)"))
+
+    def test_entailment_respects_operator_precedence(self):
+        self.base.expand("~r", 20)
+        # ~p | (q & r) is satisfiable with ~r; read as (~p | q) & r it would not be
+        self.assertFalse(resolution(self.base, "~p | q & r"))
+        self.assertTrue(resolution(self.base, "(~p | q) & r"))
+
+    def test_negation_of_nested_formula(self):
+        self.base.expand("r", 20)
+        # The & inside the parentheses must not be split off by the negation
+        self.assertTrue(resolution(self.base, negate_formula("(p & q) | r", self.base)))
+        self.assertFalse(resolution(self.base, negate_formula("(p | q) & r", self.base)))
+        self.assertEqual(negate_formula("p | q", self.base), "~p & ~q")
+
+    def test_negation_of_several_clauses(self):
+        self.base.expand("a0", 10)
+        # Negated back to CNF; a Tseitin-encoded DNF made these saturate for minutes
+        self.assertEqual(
+            negate_formula("(a0 & b0) | (a1 & b1)", self.base),
+            "(~a0 | ~b0) & (~a1 | ~b1)",
+        )
+        query = "(a0 & b0) | (a1 & b1) | (a2 & b2) | (a3 & b3)"
+        self.assertFalse(resolution(self.base, negate_formula(query, self.base)))
+        self.base.revise("(a0 | b0) & (a1 | b1) & (a2 | b2) & (a3 | b3)", 50)
+        self.assertEqual(len(self.base.beliefs), 2)
+
+    def test_entailment_horn_base(self):
+        self.base.expand("p", 20)
+        self.base.expand("p >> q", 30)
+        self.base.expand("(q & s) >> r", 30)
+        # Horn clauses are decided by unit propagation alone
+        self.assertTrue(resolution(self.base, negate_formula("q", self.base)))
+        self.assertFalse(resolution(self.base, negate_formula("r", self.base)))
+        self.assertFalse(resolution(self.base, negate_formula("~s", self.base)))
+
+    def test_entailment_with_subsumed_resolvents(self):
+        self.base.expand("p | q", 20)
+        self.base.expand("p | ~q", 30)
+        self.base.expand("~p | r | s", 40)
+        self.base.expand("~s | r", 40)
+        # Needs several rounds; tautologies like q | ~q and subsumed resolvents are dropped
+        self.assertTrue(resolution(self.base, negate_formula("r", self.base)))
+        self.assertFalse(resolution(self.base, negate_formula("s", self.base)))
+
+    def test_resolve_single_clash_only(self):
+        self.assertEqual(resolve(frozenset({1, 2}), frozenset({-1, 3})), frozenset({2, 3}))
+        # Clashing on two atoms only yields tautologies such as 2 | ~2
+        self.assertIsNone(resolve(frozenset({1, 2}), frozenset({-1, -2})))
+        self.assertIsNone(resolve(frozenset({1}), frozenset({2})))
+
     # def test_entailment_resolution_direct(self):
     #     self.base.expand("p", 20)
     #     self.base.expand("p & q", 30)
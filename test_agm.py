@@ -5,7 +5,8 @@ from resolution import negate_formula, resolution
 
 def is_consistent(belief_base):
     """Check if belief base does not entail False (i.e., is consistent)."""
-    return not resolution(belief_base, "False")
+    # The negation of False is True, which adds no clauses to the base
+    return not resolution(belief_base, "True")
 
 
 class TestAGMPostulates(unittest.TestCase):